@@ -30,8 +30,13 @@ context = Context()
 def log_from_bytes(dat: bytes) -> capnp.lib.capnp._DynamicStructReader:
   return log.Event.from_bytes(dat, traversal_limit_in_words=NO_TRAVERSAL_LIMIT)
 
-def new_message(service: Optional[str] = None, size: Optional[int] = None) -> capnp.lib.capnp._DynamicStructBuilder:
-  dat = log.Event.new_message()
+def new_message(service: Optional[str] = None, size: Optional[int] = None,
+                num_first_segment_words: Optional[int] = None) -> capnp.lib.capnp._DynamicStructBuilder:
+  if num_first_segment_words is None:
+    dat = log.Event.new_message()
+  else:
+    # a first segment sized to fit the whole message avoids allocating and zeroing the default 8 KiB segment
+    dat = log.Event.new_message(num_first_segment_words=num_first_segment_words)
   dat.logMonoTime = int(sec_since_boot() * 1e9)
   dat.valid = True
   if service is not None:
@@ -59,9 +64,9 @@ def sub_sock(endpoint: str, poller: Optional[Poller] = None, addr: str = "127.0.
   return sock
 
 
-def drain_sock_raw(sock: SubSocket, wait_for_one: bool = False) -> List[bytes]:
-  """Receive all message currently available on the queue"""
-  ret: List[bytes] = []
+def drain_sock_raw_into(sock: SubSocket, ret: List[bytes], wait_for_one: bool = False) -> List[bytes]:
+  """Same as drain_sock_raw, but clears and fills a list owned by the caller"""
+  ret.clear()
   while 1:
     if wait_for_one and len(ret) == 0:
       dat = sock.receive()
@@ -75,6 +80,10 @@ def drain_sock_raw(sock: SubSocket, wait_for_one: bool = False) -> List[bytes]:
 
   return ret
 
+def drain_sock_raw(sock: SubSocket, wait_for_one: bool = False) -> List[bytes]:
+  """Receive all message currently available on the queue"""
+  return drain_sock_raw_into(sock, [], wait_for_one)
+
 def drain_sock(sock: SubSocket, wait_for_one: bool = False) -> List[capnp.lib.capnp._DynamicStructReader]:
   """Receive all message currently available on the queue"""
   ret: List[capnp.lib.capnp._DynamicStructReader] = []
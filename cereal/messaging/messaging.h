@@ -95,6 +95,8 @@ private:
 class MessageBuilder : public capnp::MallocMessageBuilder {
 public:
   MessageBuilder() = default;
+  // build into a caller owned, zeroed first segment. capnp zeroes the used part again on destruction
+  explicit MessageBuilder(kj::ArrayPtr<capnp::word> firstSegment) : capnp::MallocMessageBuilder(firstSegment) {}
 
   cereal::Event::Builder initEvent(bool valid = true) {
     cereal::Event::Builder event = initRoot<cereal::Event>();
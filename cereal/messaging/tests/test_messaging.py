@@ -120,6 +120,13 @@ class TestMessaging(unittest.TestCase):
     self.assertTrue(msg.valid)
     self.assertEqual(evt, msg.which())
 
+  def test_new_message_first_segment_words(self):
+    msg = messaging.new_message('carState', num_first_segment_words=16)
+    msg.carState.vEgo = 1.
+    msg.carState.init('buttonEvents', 64)
+    self.assertEqual(msg.carState.vEgo, 1.)
+    self.assertEqual(len(messaging.log_from_bytes(msg.to_bytes()).carState.buttonEvents), 64)
+
   @parameterized.expand(events)
   def test_pub_sock(self, evt):
     messaging.pub_sock(evt)
@@ -153,6 +160,25 @@ class TestMessaging(unittest.TestCase):
     self.assertTrue(all(isinstance(msg, expected_type) for msg in msgs))
     self.assertEqual(len(msgs), num_msgs)
 
+  def test_drain_sock_raw_into(self):
+    sock = "carState"
+    pub_sock = messaging.pub_sock(sock)
+    sub_sock = messaging.sub_sock(sock, timeout=1000)
+    zmq_sleep()
+
+    out = [b"stale"]
+    for _ in range(3):
+      num_msgs = random.randrange(3, 10)
+      for __ in range(num_msgs):
+        pub_sock.send(messaging.new_message(sock).to_bytes())
+      time.sleep(0.1)
+
+      # the same list is returned, holding only the new messages
+      msgs = messaging.drain_sock_raw_into(sub_sock, out)
+      self.assertIs(msgs, out)
+      self.assertTrue(all(isinstance(msg, bytes) for msg in msgs))
+      self.assertEqual(len(msgs), num_msgs)
+
   def test_recv_sock(self):
     sock = "carState"
     pub_sock = messaging.pub_sock(sock)
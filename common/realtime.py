@@ -3,7 +3,7 @@ import gc
 import os
 import time
 import multiprocessing
-from typing import Optional
+from typing import List, Optional
 
 from common.clock import sec_since_boot  # pylint: disable=no-name-in-module, import-error
 from selfdrive.hardware import PC, TICI
@@ -48,10 +48,38 @@ def set_core_affinity(core: int) -> None:
         os.sched_setaffinity(0, [0,])
 
 
-def config_realtime_process(core: int, priority: int) -> None:
+def get_isolated_cores() -> List[int]:
+  """Cores taken out of the scheduler with isolcpus=, empty if there are none"""
+  try:
+    with open("/sys/devices/system/cpu/isolated") as f:
+      cpulist = f.read().strip()
+  except OSError:
+    return []
+
+  cores: List[int] = []
+  try:
+    for r in filter(None, cpulist.split(",")):
+      first, _, last = r.partition("-")
+      cores.extend(range(int(first), int(last or first) + 1))
+  except ValueError:
+    return []
+  return cores
+
+
+def config_realtime_process(core: int, priority: int, prefer_isolated: bool = False) -> None:
   gc.disable()
   set_realtime_priority(priority)
-  set_core_affinity(core)
+
+  isolated = get_isolated_cores() if prefer_isolated and not PC else []
+  if isolated:
+    # pin to one isolated core, the requested one if it is isolated
+    try:
+      os.sched_setaffinity(0, [core if core in isolated else isolated[0]])
+    except OSError:
+      # isolated cores can be offline or outside our cpuset
+      set_core_affinity(core)
+  else:
+    set_core_affinity(core)
 
 
 class Ratekeeper:
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+import unittest
+from unittest.mock import mock_open, patch
+
+from common.realtime import config_realtime_process, get_isolated_cores
+
+
+class TestIsolatedCores(unittest.TestCase):
+  def _isolated(self, cpulist):
+    with patch("builtins.open", mock_open(read_data=cpulist)):
+      return get_isolated_cores()
+
+  def test_cpulist(self):
+    self.assertEqual(self._isolated(""), [])
+    self.assertEqual(self._isolated("\n"), [])
+    self.assertEqual(self._isolated("2"), [2])
+    self.assertEqual(self._isolated("2-3\n"), [2, 3])
+    self.assertEqual(self._isolated("1-3,6"), [1, 2, 3, 6])
+
+  def test_invalid_cpulist(self):
+    self.assertEqual(self._isolated("garbage"), [])
+    self.assertEqual(self._isolated("1-x"), [])
+
+  def test_missing_file(self):
+    with patch("builtins.open", side_effect=FileNotFoundError):
+      self.assertEqual(get_isolated_cores(), [])
+
+
+@patch("common.realtime.PC", False)
+@patch("common.realtime.gc.disable")
+@patch("common.realtime.set_realtime_priority")
+class TestConfigRealtimeProcess(unittest.TestCase):
+  def _config(self, isolated, core=5, setaffinity_error=None):
+    with patch("common.realtime.get_isolated_cores", return_value=isolated), \
+         patch("common.realtime.os.sched_setaffinity", side_effect=setaffinity_error) as setaffinity, \
+         patch("common.realtime.set_core_affinity") as set_core_affinity:
+      config_realtime_process(core, 50, prefer_isolated=True)
+    return setaffinity, set_core_affinity
+
+  def test_isolated_core(self, *_):
+    setaffinity, set_core_affinity = self._config([4, 5])
+    setaffinity.assert_called_once_with(0, [5])
+    set_core_affinity.assert_not_called()
+
+    setaffinity, set_core_affinity = self._config([2, 3])
+    setaffinity.assert_called_once_with(0, [2])
+    set_core_affinity.assert_not_called()
+
+  def test_no_isolated_cores(self, *_):
+    setaffinity, set_core_affinity = self._config([])
+    setaffinity.assert_not_called()
+    set_core_affinity.assert_called_once_with(5)
+
+  def test_setaffinity_fallback(self, *_):
+    setaffinity, set_core_affinity = self._config([2, 3], setaffinity_error=OSError)
+    setaffinity.assert_called_once_with(0, [2])
+    set_core_affinity.assert_called_once_with(5)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -1,10 +1,14 @@
 #include "cereal/messaging/messaging.h"
 #include "panda.h"
 
+// reused first segment, large enough for a typical can/sendcan batch. bigger batches spill into extra segments
+const size_t CAN_LIST_SEGMENT_WORDS = 1024;
+static thread_local capnp::word can_list_segment[CAN_LIST_SEGMENT_WORDS];
+
 extern "C" {
 
 void can_list_to_can_capnp_cpp(const std::vector<can_frame> &can_list, std::string &out, bool sendCan, bool valid) {
-  MessageBuilder msg;
+  MessageBuilder msg(kj::arrayPtr(can_list_segment, CAN_LIST_SEGMENT_WORDS));
   auto event = msg.initEvent(valid);
 
   auto canData = sendCan ? event.initSendcan(can_list.size()) : event.initCan(can_list.size());
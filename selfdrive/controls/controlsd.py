@@ -1,11 +1,13 @@
 #!/usr/bin/env python3
 import os
+import re
 import math
 import numpy as np
 from numbers import Number
+from operator import attrgetter
 
 from cereal import car, log
-from common.numpy_fast import clip, interp, mean
+from common.numpy_fast import clip, mean
 from common.realtime import sec_since_boot, config_realtime_process, Priority, Ratekeeper, DT_CTRL
 from common.profiler import Profiler
 from common.params import Params, put_nonblocking
@@ -22,9 +24,11 @@ from selfdrive.controls.lib.latcontrol_pid import LatControlPID
 from selfdrive.controls.lib.latcontrol_indi import LatControlINDI
 from selfdrive.controls.lib.latcontrol_lqr import LatControlLQR
 from selfdrive.controls.lib.latcontrol_angle import LatControlAngle
-from selfdrive.controls.lib.events import Events, ET
+from selfdrive.controls.lib.events import Events, ET, ENABLE_BIT, PRE_ENABLE_BIT, NO_ENTRY_BIT, USER_DISABLE_BIT, \
+                                            SOFT_DISABLE_BIT, IMMEDIATE_DISABLE_BIT
 from selfdrive.controls.lib.alertmanager import AlertManager, set_offroad_alert
 from selfdrive.controls.lib.vehicle_model import VehicleModel
+from selfdrive.controls.lib.curve_speed_pyx import curve_model_speed  # pylint: disable=no-name-in-module, import-error
 from selfdrive.locationd.calibrationd import Calibration
 from selfdrive.hardware import HARDWARE, TICI, EON
 from selfdrive.manager.process_config import managed_processes
@@ -42,6 +46,15 @@ LDW_MIN_SPEED = 31 * CV.MPH_TO_MS
 LANE_DEPARTURE_THRESHOLD = 0.1
 STEER_ANGLE_SATURATION_TIMEOUT = 1.0 / DT_CTRL
 STEER_ANGLE_SATURATION_THRESHOLD = 2.5  # Degrees
+CURVE_SPEED_PERIOD = 10  # frames between curve speed updates
+ROAD_LIMITER_PERIOD = 5  # frames between road speed limiter updates
+PUBLISH_SEGMENT_WORDS = 512  # first segment size for messages published every frame, fits each in one segment
+FAN_TIMEOUT_FRAMES = int(5.0 / DT_CTRL)
+SENSOR_WARMUP_FRAMES = int(5.0 / DT_CTRL)
+CRUISE_MISMATCH_FRAMES = int(3.0 / DT_CTRL)
+BLINKER_COOLDOWN_FRAMES = int(5.0 / DT_CTRL)
+CAR_EVENTS_PERIOD = int(1.0 / DT_CTRL)
+CAR_PARAMS_PERIOD = int(50.0 / DT_CTRL)
 
 REPLAY = "REPLAY" in os.environ
 SIMULATION = "SIMULATION" in os.environ
@@ -51,28 +64,53 @@ IGNORE_PROCESSES = {"rtshield", "uploader", "deleter", "loggerd", "logmessaged",
                     {k for k, v in managed_processes.items() if not v.enabled}
 
 ACTUATOR_FIELDS = set(car.CarControl.Actuators.schema.fields.keys())
+_actuators_default = car.CarControl.Actuators.new_message()
+NUMERIC_ACTUATOR_FIELDS = tuple(p for p in sorted(ACTUATOR_FIELDS) if isinstance(getattr(_actuators_default, p), Number))
+del _actuators_default
+get_numeric_actuators = attrgetter(*NUMERIC_ACTUATOR_FIELDS)
 
 ThermalStatus = log.DeviceState.ThermalStatus
 State = log.ControlsState.OpenpilotState
 PandaType = log.PandaState.PandaType
 Desire = log.LateralPlan.Desire
+LANE_CHANGE_LEFT_IDX = Desire.laneChangeLeft - 1
+LANE_CHANGE_RIGHT_IDX = Desire.laneChangeRight - 1
 LaneChangeState = log.LateralPlan.LaneChangeState
 LaneChangeDirection = log.LateralPlan.LaneChangeDirection
 EventName = car.CarEvent.EventName
 ButtonEvent = car.CarState.ButtonEvent
 SafetyModel = car.CarParams.SafetyModel
 
-IGNORED_SAFETY_MODES = [SafetyModel.silent, SafetyModel.noOutput]
+IGNORED_SAFETY_MODES = frozenset((SafetyModel.silent, SafetyModel.noOutput))
+
+CAMERA_ERROR_RE = re.compile("ERROR_CRC|ERROR_ECC|ERROR_STREAM_UNDERFLOW|APPLY FAILED")
+CAMERA_ERROR_EVENTS = {"0": EventName.roadCameraError, "1": EventName.wideRoadCameraError,
+                       "2": EventName.driverCameraError}
 
 
 class Controls:
+  # fixed attribute layout, every attribute set on self must be listed here
+  __slots__ = ('pm', 'sm', 'can_sock', 'can_strs', 'log_sock', 'camera_packets', 'joystick_mode',
+               'CI', 'CP', 'CC', 'AM', 'events', 'LoC', 'LaC', 'VM', 'rk', 'prof',
+               'angle_steer_control', 'lat_state_field',
+               'is_metric', 'is_ldw_enabled', 'read_only', 'expected_safety', 'startup_event',
+               'initialized', 'state', 'enabled', 'active', 'can_rcv_error', 'soft_disable_timer',
+               'v_cruise_kph', 'v_cruise_kph_last', 'v_cruise_kph_limit', 'max_speed_clu', 'curve_speed_ms',
+               'curve_speed_tick', 'applyMaxSpeed', 'roadLimitSpeedActive', 'roadLimitSpeed', 'roadLimitSpeedLeftDist',
+               'road_limiter_result', 'road_limiter_active', 'road_limiter_tick',
+               'kph_to_clu_factor', 'brake_set_speed_clu', 'min_set_speed_clu', 'max_set_speed_clu',
+               'min_limit_speed_clu', 'limited_lead', 'speed_conv_to_ms', 'speed_conv_to_clu', 'curve_x', 'curve_y',
+               'slowing_down', 'slowing_down_alert', 'slowing_down_sound_alert', 'active_cam', 'is_cruise_enabled',
+               'mismatch_counter', 'cruise_mismatch_counter', 'can_error_counter', 'last_blinker_frame',
+               'saturated_count', 'distance_traveled', 'last_functional_fan_frame', 'last_manager_frame',
+               'not_running', 'events_prev', 'current_alert_types', 'logged_comm_issue', 'device_events',
+               'last_device_frame', 'button_timers')
 
   def kph_to_clu(self, kph):
-    speed_conv_to_clu = CV.MS_TO_KPH if self.is_metric else CV.MS_TO_MPH
-    return int(kph * CV.KPH_TO_MS * speed_conv_to_clu)
+    return int(kph * self.kph_to_clu_factor)
 
   def __init__(self, sm=None, pm=None, can_sock=None):
-    config_realtime_process(4 if TICI else 3, Priority.CTRL_HIGH)
+    config_realtime_process(4 if TICI else 3, Priority.CTRL_HIGH, prefer_isolated=True)
 
     # Setup sockets
     self.pm = pm
@@ -100,13 +138,14 @@ class Controls:
     if can_sock is None:
       can_timeout = None if os.environ.get('NO_CAN_TIMEOUT', False) else 100
       self.can_sock = messaging.sub_sock('can', timeout=can_timeout)
+    self.can_strs = []
 
     if TICI:
       self.log_sock = messaging.sub_sock('androidLog')
 
     # wait for one pandaState and one CAN packet
     panda_type =  self.sm['peripheralState'].pandaType
-    has_relay = panda_type in [PandaType.blackPanda, PandaType.uno, PandaType.dos]
+    has_relay = panda_type.raw in {PandaType.blackPanda, PandaType.uno, PandaType.dos}
     print("Waiting for CAN messages...")
     get_one_can(self.can_sock)
 
@@ -114,6 +153,7 @@ class Controls:
 
     # read params
     self.is_metric = params.get_bool("IsMetric")
+    self.kph_to_clu_factor = CV.KPH_TO_MS * (CV.MS_TO_KPH if self.is_metric else CV.MS_TO_MPH)
     self.is_ldw_enabled = params.get_bool("IsLdwEnabled")
     community_feature_toggle = params.get_bool("CommunityFeaturesToggle")
     openpilot_enabled_toggle = params.get_bool("OpenpilotEnabledToggle")
@@ -135,6 +175,9 @@ class Controls:
       safety_config.safetyModel = car.CarParams.SafetyModel.noOutput
       self.CP.safetyConfigs = [safety_config]
 
+    # safetyConfigs are fixed from here on, checked against every pandaState in update_events
+    self.expected_safety = [(c.safetyModel.raw, c.safetyParam) for c in self.CP.safetyConfigs]
+
     # Write CarParams for radard
     cp_bytes = self.CP.to_bytes()
     params.put("CarParams", cp_bytes)
@@ -147,14 +190,24 @@ class Controls:
     self.LoC = LongControl(self.CP)
     self.VM = VehicleModel(self.CP)
 
-    if self.CP.steerControlType == car.CarParams.SteerControlType.angle:
+    # steering control type and lateral tuning are fixed for the process, pick the controller and its log field once
+    self.angle_steer_control = self.CP.steerControlType == car.CarParams.SteerControlType.angle
+    lat_tuning = self.CP.lateralTuning.which()
+    self.lat_state_field = None
+    if self.angle_steer_control:
       self.LaC = LatControlAngle(self.CP)
-    elif self.CP.lateralTuning.which() == 'pid':
+      self.lat_state_field = 'angleState'
+    elif lat_tuning == 'pid':
       self.LaC = LatControlPID(self.CP, self.CI)
-    elif self.CP.lateralTuning.which() == 'indi':
+      self.lat_state_field = 'pidState'
+    elif lat_tuning == 'indi':
       self.LaC = LatControlINDI(self.CP)
-    elif self.CP.lateralTuning.which() == 'lqr':
+      self.lat_state_field = 'indiState'
+    elif lat_tuning == 'lqr':
       self.LaC = LatControlLQR(self.CP)
+      self.lat_state_field = 'lqrState'
+    if self.joystick_mode:
+      self.lat_state_field = 'debugState'
 
     self.initialized = False
     self.state = State.disabled
@@ -166,15 +219,20 @@ class Controls:
     self.v_cruise_kph_last = 0
     self.max_speed_clu = 0.
     self.curve_speed_ms = 0.
+    self.curve_speed_tick = 0
     self.v_cruise_kph_limit = 0
     self.applyMaxSpeed = 0
     self.roadLimitSpeedActive = 0
     self.roadLimitSpeed = 0
     self.roadLimitSpeedLeftDist = 0
+    self.road_limiter_result = (0, 0, 0)
+    self.road_limiter_tick = 0
+    self.road_limiter_active = 0
 
     self.brake_set_speed_clu = self.kph_to_clu(10)  # 브레이크 최저속도 20km
     self.min_set_speed_clu = self.kph_to_clu(MIN_SET_SPEED_KPH)
     self.max_set_speed_clu = self.kph_to_clu(MAX_SET_SPEED_KPH)
+    self.min_limit_speed_clu = self.kph_to_clu(30)
 
     # 앞차 거리 (PSK) 2021.10.15
     # 레이더 비전 상태를 저장한다.
@@ -183,6 +241,10 @@ class Controls:
     self.speed_conv_to_ms = CV.KPH_TO_MS if self.is_metric else CV.MPH_TO_MS
     self.speed_conv_to_clu = CV.MS_TO_KPH if self.is_metric else CV.MS_TO_MPH
 
+    # path buffers for the curvature kernel, refilled in place every call
+    self.curve_x = np.zeros(TRAJECTORY_SIZE, dtype=np.float64)
+    self.curve_y = np.zeros(TRAJECTORY_SIZE, dtype=np.float64)
+
     self.slowing_down = False
     self.slowing_down_alert = False
     self.slowing_down_sound_alert = False
@@ -199,9 +261,13 @@ class Controls:
     self.saturated_count = 0
     self.distance_traveled = 0
     self.last_functional_fan_frame = 0
+    self.last_manager_frame = 0
+    self.not_running = set()
     self.events_prev = []
     self.current_alert_types = [ET.PERMANENT]
     self.logged_comm_issue = False
+    self.device_events = []
+    self.last_device_frame = -1
     self.button_timers = {ButtonEvent.Type.decelCruise: 0, ButtonEvent.Type.accelCruise: 0}
 
     # TODO: no longer necessary, aside from process replay
@@ -267,39 +333,48 @@ class Controls:
 
       return 0
 
-  def cal_curve_speed(self, sm, v_ego, frame):
+  def cal_curve_speed(self, sm, v_ego):
 
-      if frame % 20 == 0:
-         md = sm['modelV2']
-         if len(md.position.x) == TRAJECTORY_SIZE and len(md.position.y) == TRAJECTORY_SIZE:
-            x = md.position.x
-            y = md.position.y
-            dy = np.gradient(y, x)
-            d2y = np.gradient(dy, x)
-            curv = d2y / (1 + dy ** 2) ** 1.5
+    self.curve_speed_tick -= 1
+    if self.curve_speed_tick > 0:
+      return self.curve_speed_ms
+    self.curve_speed_tick = CURVE_SPEED_PERIOD
 
-            start = int(interp(v_ego, [10., 27.], [10, TRAJECTORY_SIZE - 10]))
-            curv = curv[start:min(start + 10, TRAJECTORY_SIZE)]
-            a_y_max = 2.975 - v_ego * 0.0375  # ~1.85 @ 75mph, ~2.6 @ 25mph
-            v_curvature = np.sqrt(a_y_max / np.clip(np.abs(curv), 1e-4, None))
-            model_speed = np.mean(v_curvature) * 0.85 * ntune_scc_get("sccCurvatureFactor")   #  MIN : 0.5, MAX : 1.5, DEFAULT : 0.98
+    md = sm['modelV2']
+    if md is not None and len(md.position.x) == TRAJECTORY_SIZE and len(md.position.y) == TRAJECTORY_SIZE:
+      x = self.curve_x
+      y = self.curve_y
+      x[:] = md.position.x
+      y[:] = md.position.y
+      model_speed = curve_model_speed(x, y, v_ego, 5, TRAJECTORY_SIZE - 10,
+                                      0.70 * ntune_scc_get("sccCurvatureFactor"))   #  MIN : 0.5, MAX : 1.5, DEFAULT : 0.98
 
-            if model_speed < v_ego:
-              self.curve_speed_ms = float(max(model_speed, MIN_CURVE_SPEED))
-            else:
-              self.curve_speed_ms = 255.
+      if model_speed < v_ego:
+        self.curve_speed_ms = float(max(model_speed, MIN_CURVE_SPEED))
+      else:
+        self.curve_speed_ms = 255.
 
-            if np.isnan(self.curve_speed_ms):
-              self.curve_speed_ms = 255.
-         else:
-           self.curve_speed_ms = 255.
+      if np.isnan(self.curve_speed_ms):
+        self.curve_speed_ms = 255.
+    else:
+      self.curve_speed_ms = 255.
 
+    return self.curve_speed_ms
 
   # [크루즈 MAX 속도 설정] #
   def cal_max_speed(self, frame: int, vEgo, sm, CS):
 
-      apply_limit_speed, road_limit_speed, left_dist, first_started, max_speed_log = \
-          road_speed_limiter_get_max_speed(vEgo, self.is_metric)
+      # the limiter follows a slower external source, so only query it every ROAD_LIMITER_PERIOD frames
+      self.road_limiter_tick -= 1
+      if self.road_limiter_tick <= 0:
+        self.road_limiter_tick = ROAD_LIMITER_PERIOD
+        apply_limit_speed, road_limit_speed, left_dist, first_started, max_speed_log = \
+            road_speed_limiter_get_max_speed(vEgo, self.is_metric)
+        self.road_limiter_result = (apply_limit_speed, road_limit_speed, left_dist)
+        self.road_limiter_active = road_speed_limiter_get_active()
+      else:
+        apply_limit_speed, road_limit_speed, left_dist = self.road_limiter_result
+        first_started = False
 
       # print("apply_limit_speed : ", apply_limit_speed)
       # print("road_limit_speed : ", road_limit_speed)
@@ -307,8 +382,7 @@ class Controls:
       # print("first_started : ", first_started)
       # print("max_speed_log : ", max_speed_log)
 
-      # self, sm, v_ego, frame
-      self.cal_curve_speed(sm, vEgo, frame)
+      self.cal_curve_speed(sm, vEgo)
 
       if SLOW_ON_CURVES and self.curve_speed_ms >= MIN_CURVE_SPEED:
           max_speed_clu = min(self.v_cruise_kph * CV.KPH_TO_MS, self.curve_speed_ms) * self.speed_conv_to_clu
@@ -317,7 +391,7 @@ class Controls:
 
       max_speed_log = ""
 
-      if apply_limit_speed >= self.kph_to_clu(30):
+      if apply_limit_speed >= self.min_limit_speed_clu:
 
         # 크루즈 초기 설정 속도 (PSK)
         # controls.v_cruise_kph : 크루즈 설정 속도
@@ -371,32 +445,48 @@ class Controls:
     """Compute carEvents from carState"""
 
     self.events.clear()
-    self.events.add_from_msg(CS.events)
-    self.events.add_from_msg(self.sm['driverMonitoringState'].events)
 
     # Handle startup event
     if self.startup_event is not None:
       self.events.add(self.startup_event)
       self.startup_event = None
 
-    # Don't add any more events if not initialized
+    # Don't add any more events if not initialized, car and driver monitoring events included
     if not self.initialized:
       self.events.add(EventName.controlsInitializing)
       return
 
+    self.events.add_from_msg(CS.events)
+    self.events.add_from_msg(self.sm['driverMonitoringState'].events)
+
+    ds = self.sm['deviceState']
+    ps = self.sm['peripheralState']
+    md = self.sm['modelV2']
+    lp = self.sm['lateralPlan']
+    llk = self.sm['liveLocationKalman']
+    long_plan = self.sm['longitudinalPlan']
+    pss = self.sm['pandaStates']
+
     # Create events for battery, temperature, disk space, and memory
-    if EON and (self.sm['peripheralState'].pandaType != PandaType.uno) and \
-       self.sm['deviceState'].batteryPercent < 1 and self.sm['deviceState'].chargingError:
+    if EON and (ps.pandaType != PandaType.uno) and ds.batteryPercent < 1 and ds.chargingError:
       # at zero percent battery, while discharging, OP should not allowed
       self.events.add(EventName.lowBattery)
-    if self.sm['deviceState'].thermalStatus >= ThermalStatus.red:
-      self.events.add(EventName.overheat)
-    if self.sm['deviceState'].freeSpacePercent < 7 and not SIMULATION:
-      # under 7% of space free no enable allowed
-      self.events.add(EventName.outOfSpace)
-    # TODO: make tici threshold the same
-    if self.sm['deviceState'].memoryUsagePercent > (90 if TICI else 65) and not SIMULATION:
-      self.events.add(EventName.lowMemory)
+
+    # deviceState only arrives at 2Hz, reuse its events until the next message
+    device_frame = self.sm.rcv_frame['deviceState']
+    if device_frame != self.last_device_frame:
+      self.device_events.clear()
+      if ds.thermalStatus >= ThermalStatus.red:
+        self.device_events.append(EventName.overheat)
+      if ds.freeSpacePercent < 7 and not SIMULATION:
+        # under 7% of space free no enable allowed
+        self.device_events.append(EventName.outOfSpace)
+      # TODO: make tici threshold the same
+      if ds.memoryUsagePercent > (90 if TICI else 65) and not SIMULATION:
+        self.device_events.append(EventName.lowMemory)
+      self.last_device_frame = device_frame
+    for e in self.device_events:
+      self.events.add(e)
 
     # TODO: enable this once loggerd CPU usage is more reasonable
     #cpus = list(self.sm['deviceState'].cpuUsagePercent)[:(-1 if EON else None)]
@@ -404,9 +494,9 @@ class Controls:
     #  self.events.add(EventName.highCpuUsage)
 
     # Alert if fan isn't spinning for 5 seconds
-    if self.sm['peripheralState'].pandaType in [PandaType.uno, PandaType.dos]:
-      if self.sm['peripheralState'].fanSpeedRpm == 0 and self.sm['deviceState'].fanSpeedPercentDesired > 50:
-        if (self.sm.frame - self.last_functional_fan_frame) * DT_CTRL > 5.0:
+    if ps.pandaType.raw in {PandaType.uno, PandaType.dos}:
+      if ps.fanSpeedRpm == 0 and ds.fanSpeedPercentDesired > 50:
+        if self.sm.frame - self.last_functional_fan_frame > FAN_TIMEOUT_FRAMES:
           self.events.add(EventName.fanMalfunction)
       else:
         self.last_functional_fan_frame = self.sm.frame
@@ -420,8 +510,8 @@ class Controls:
         self.events.add(EventName.calibrationInvalid)
 
     # Handle lane change
-    if self.sm['lateralPlan'].laneChangeState == LaneChangeState.preLaneChange:
-      direction = self.sm['lateralPlan'].laneChangeDirection
+    if lp.laneChangeState == LaneChangeState.preLaneChange:
+      direction = lp.laneChangeDirection
       if (CS.leftBlindspot and direction == LaneChangeDirection.left) or \
          (CS.rightBlindspot and direction == LaneChangeDirection.right):
         self.events.add(EventName.laneChangeBlocked)
@@ -430,24 +520,43 @@ class Controls:
           self.events.add(EventName.preLaneChangeLeft)
         else:
           self.events.add(EventName.preLaneChangeRight)
-    elif self.sm['lateralPlan'].laneChangeState in [LaneChangeState.laneChangeStarting,
-                                                 LaneChangeState.laneChangeFinishing]:
+    elif lp.laneChangeState in [LaneChangeState.laneChangeStarting,
+                                LaneChangeState.laneChangeFinishing]:
       self.events.add(EventName.laneChange)
 
     if self.can_rcv_error or not CS.canValid:
       self.events.add(EventName.canError)
 
-    for i, pandaState in enumerate(self.sm['pandaStates']):
+    safety_mismatch = False
+    controls_not_allowed = False
+    relay_malfunction = False
+    expected_safety = self.expected_safety
+    num_expected = len(expected_safety)
+    for i, pandaState in enumerate(pss):
+      safety_model = pandaState.safetyModel.raw
+      ignored = safety_model in IGNORED_SAFETY_MODES
       # All pandas must match the list of safetyConfigs, and if outside this list, must be silent or noOutput
-      if i < len(self.CP.safetyConfigs):
-        safety_mismatch = pandaState.safetyModel != self.CP.safetyConfigs[i].safetyModel or pandaState.safetyParam != self.CP.safetyConfigs[i].safetyParam
+      if i < num_expected:
+        safety_mismatch |= (safety_model, pandaState.safetyParam) != expected_safety[i]
       else:
-        safety_mismatch = pandaState.safetyModel not in IGNORED_SAFETY_MODES
-      if safety_mismatch or self.mismatch_counter >= 200:
-        self.events.add(EventName.controlsMismatch)
+        safety_mismatch |= not ignored
+      # All pandas not in silent mode must have controlsAllowed when openpilot is enabled
+      controls_not_allowed |= not ignored and not pandaState.controlsAllowed
+      relay_malfunction |= log.PandaState.FaultType.relayMalfunction in pandaState.faults
 
-      if log.PandaState.FaultType.relayMalfunction in pandaState.faults:
-        self.events.add(EventName.relayMalfunction)
+    # When the panda and controlsd do not agree on controls_allowed
+    # we want to disengage openpilot. However the status from the panda goes through
+    # another socket other than the CAN messages and one can arrive earlier than the other.
+    # Therefore we allow a mismatch for two samples, then we trigger the disengagement.
+    if not self.enabled:
+      self.mismatch_counter = 0
+    elif controls_not_allowed:
+      self.mismatch_counter += 1
+
+    if safety_mismatch or self.mismatch_counter >= 200:
+      self.events.add(EventName.controlsMismatch)
+    if relay_malfunction:
+      self.events.add(EventName.relayMalfunction)
 
     # Check for HW or system issues
     if len(self.sm['radarState'].radarErrors):
@@ -466,30 +575,27 @@ class Controls:
 
     if not self.sm['liveParameters'].valid:
       self.events.add(EventName.vehicleModelInvalid)
-    if not self.sm['lateralPlan'].mpcSolutionValid:
+    if not lp.mpcSolutionValid:
       self.events.add(EventName.plannerError)
-    if not self.sm['liveLocationKalman'].sensorsOK and not NOSENSOR:
-      if self.sm.frame > 5 / DT_CTRL:  # Give locationd some time to receive all the inputs
+    if not llk.sensorsOK and not NOSENSOR:
+      if self.sm.frame > SENSOR_WARMUP_FRAMES:  # Give locationd some time to receive all the inputs
         self.events.add(EventName.sensorDataInvalid)
-    if not self.sm['liveLocationKalman'].posenetOK:
+    if not llk.posenetOK:
       self.events.add(EventName.posenetInvalid)
-    if not self.sm['liveLocationKalman'].deviceStable:
+    if not llk.deviceStable:
       self.events.add(EventName.deviceFalling)
-    for pandaState in self.sm['pandaStates']:
-      if log.PandaState.FaultType.relayMalfunction in pandaState.faults:
-        self.events.add(EventName.relayMalfunction)
 
     if not REPLAY:
       # Check for mismatch between openpilot and car's PCM
       cruise_mismatch = CS.cruiseState.enabled and (not self.enabled or not self.CP.pcmCruise)
       self.cruise_mismatch_counter = self.cruise_mismatch_counter + 1 if cruise_mismatch else 0
-      if self.cruise_mismatch_counter > int(3. / DT_CTRL):
+      if self.cruise_mismatch_counter > CRUISE_MISMATCH_FRAMES:
         self.events.add(EventName.cruiseMismatch)
 
     # Check for FCW
     stock_long_is_braking = self.enabled and not self.CP.openpilotLongitudinalControl and CS.aEgo < -1.5
-    model_fcw = self.sm['modelV2'].meta.hardBrakePredicted and not CS.brakePressed and not stock_long_is_braking
-    planner_fcw = self.sm['longitudinalPlan'].fcw and self.enabled
+    model_fcw = md.meta.hardBrakePredicted and not CS.brakePressed and not stock_long_is_braking
+    planner_fcw = long_plan.fcw and self.enabled
     if planner_fcw or model_fcw:
       self.events.add(EventName.fcw)
 
@@ -501,24 +607,19 @@ class Controls:
       self.events.add(EventName.slowingDownSpeed)
 
     if TICI:
-      logs = messaging.drain_sock(self.log_sock, wait_for_one=False)
-      messages = []
-      for m in logs:
+      for msg in messaging.drain_sock(self.log_sock, wait_for_one=False):
         try:
-          messages.append(m.androidLog.message)
+          m = msg.androidLog.message
         except UnicodeDecodeError:
-          pass
+          continue
 
-      for err in ["ERROR_CRC", "ERROR_ECC", "ERROR_STREAM_UNDERFLOW", "APPLY FAILED"]:
-        for m in messages:
-          if err not in m:
-            continue
+        if CAMERA_ERROR_RE.search(m) is None:
+          continue
 
-          csid = m.split("CSID:")[-1].split(" ")[0]
-          evt = {"0": EventName.roadCameraError, "1": EventName.wideRoadCameraError,
-                 "2": EventName.driverCameraError}.get(csid, None)
-          if evt is not None:
-            self.events.add(evt)
+        csid = m.rpartition("CSID:")[2].partition(" ")[0]
+        evt = CAMERA_ERROR_EVENTS.get(csid, None)
+        if evt is not None:
+          self.events.add(evt)
 
     # TODO: fix simulator
     if not SIMULATION:
@@ -528,33 +629,24 @@ class Controls:
           #self.events.add(EventName.noGps)
       if not self.sm.all_alive(self.camera_packets):
         self.events.add(EventName.cameraMalfunction)
-      if self.sm['modelV2'].frameDropPerc > 20:
+      if md.frameDropPerc > 20:
         self.events.add(EventName.modeldLagging)
-      if self.sm['liveLocationKalman'].excessiveResets:
+      if llk.excessiveResets:
         self.events.add(EventName.localizerMalfunction)
 
       # Check if all manager processes are running
-      not_running = set(p.name for p in self.sm['managerState'].processes if not p.running)
-      if self.sm.rcv_frame['managerState'] and (not_running - IGNORE_PROCESSES):
+      mgr_frame = self.sm.rcv_frame['managerState']
+      if mgr_frame != self.last_manager_frame:
+        self.not_running = {p.name for p in self.sm['managerState'].processes if not p.running} - IGNORE_PROCESSES
+        self.last_manager_frame = mgr_frame
+      if self.not_running:
         self.events.add(EventName.processNotRunning)
 
-    # Only allow engagement with brake pressed when stopped behind another stopped car
-    # 정차한 다른 차 뒤에 정차할 때만 브레이크를 밟은 상태로 맞물릴 수 있습니다.
-    speeds = self.sm['longitudinalPlan'].speeds
-    if len(speeds) > 1:
-      v_future = speeds[-1]
-    else:
-      v_future = 100.0
-    # MAD MODE
-    #if CS.brakePressed and v_future >= STARTING_TARGET_SPEED \
-      #and self.CP.openpilotLongitudinalControl and CS.vEgo < 0.3:
-      #self.events.add(EventName.noTarget)
-
   def data_sample(self):
     """Receive data from sockets and update carState"""
 
     # Update carState from CAN
-    can_strs = messaging.drain_sock_raw(self.can_sock, wait_for_one=True)
+    can_strs = messaging.drain_sock_raw_into(self.can_sock, self.can_strs, wait_for_one=True)
     CS = self.CI.update(self.CC, can_strs)
 
     self.sm.update(0)
@@ -573,49 +665,10 @@ class Controls:
     else:
       self.can_rcv_error = False
 
-    # When the panda and controlsd do not agree on controls_allowed
-    # we want to disengage openpilot. However the status from the panda goes through
-    # another socket other than the CAN messages and one can arrive earlier than the other.
-    # Therefore we allow a mismatch for two samples, then we trigger the disengagement.
-    if not self.enabled:
-      self.mismatch_counter = 0
-
-    # All pandas not in silent mode must have controlsAllowed when openpilot is enabled
-    if any(not ps.controlsAllowed and self.enabled for ps in self.sm['pandaStates']
-           if ps.safetyModel not in IGNORED_SAFETY_MODES):
-      self.mismatch_counter += 1
-
     self.distance_traveled += CS.vEgo * DT_CTRL
 
     return CS
 
-  def cal_curve_speed(self, sm, v_ego, frame):
-
-    if frame % 10 == 0:
-      md = sm['modelV2']
-      if md is not None and len(md.position.x) == TRAJECTORY_SIZE and len(md.position.y) == TRAJECTORY_SIZE:
-        x = md.position.x
-        y = md.position.y
-        dy = np.gradient(y, x)
-        d2y = np.gradient(dy, x)
-        curv = d2y / (1 + dy ** 2) ** 1.5
-        curv = curv[5:TRAJECTORY_SIZE - 10]
-        a_y_max = 2.975 - v_ego * 0.0375  # ~1.85 @ 75mph, ~2.6 @ 25mph
-        v_curvature = np.sqrt(a_y_max / np.clip(np.abs(curv), 1e-4, None))
-        model_speed = np.mean(v_curvature) * 0.70
-
-        if model_speed < v_ego:
-          self.curve_speed_ms = float(max(model_speed, 32. * CV.KPH_TO_MS))
-        else:
-          self.curve_speed_ms = 255.
-
-        if np.isnan(self.curve_speed_ms):
-          self.curve_speed_ms = 255.
-      else:
-        self.curve_speed_ms = 255.
-
-    return self.curve_speed_ms
-
   def state_transition(self, CS):
     """Compute conditional state transitions and execute actions on state transitions"""
 
@@ -633,34 +686,36 @@ class Controls:
     # entrance in SOFT_DISABLING state
     self.soft_disable_timer = max(0, self.soft_disable_timer - 1)
 
-    self.current_alert_types = [ET.PERMANENT]
+    self.current_alert_types.clear()
+    self.current_alert_types.append(ET.PERMANENT)
+    event_types = self.events.type_mask()
 
     # ENABLED, PRE ENABLING, SOFT DISABLING
     if self.state != State.disabled:
       # user and immediate disable always have priority in a non-disabled state
-      if self.events.any(ET.USER_DISABLE):
+      if event_types & USER_DISABLE_BIT:
         self.state = State.disabled
         self.current_alert_types.append(ET.USER_DISABLE)
 
-      elif self.events.any(ET.IMMEDIATE_DISABLE):
+      elif event_types & IMMEDIATE_DISABLE_BIT:
         self.state = State.disabled
         self.current_alert_types.append(ET.IMMEDIATE_DISABLE)
 
       else:
         # ENABLED
         if self.state == State.enabled:
-          if self.events.any(ET.SOFT_DISABLE):
+          if event_types & SOFT_DISABLE_BIT:
             self.state = State.softDisabling
             self.soft_disable_timer = int(SOFT_DISABLE_TIME / DT_CTRL)
             self.current_alert_types.append(ET.SOFT_DISABLE)
 
         # SOFT DISABLING
         elif self.state == State.softDisabling:
-          if not self.events.any(ET.SOFT_DISABLE):
+          if not event_types & SOFT_DISABLE_BIT:
             # no more soft disabling condition, so go back to ENABLED
             self.state = State.enabled
 
-          elif self.events.any(ET.SOFT_DISABLE) and self.soft_disable_timer > 0:
+          elif event_types & SOFT_DISABLE_BIT and self.soft_disable_timer > 0:
             self.current_alert_types.append(ET.SOFT_DISABLE)
 
           elif self.soft_disable_timer <= 0:
@@ -668,19 +723,19 @@ class Controls:
 
         # PRE ENABLING
         elif self.state == State.preEnabled:
-          if not self.events.any(ET.PRE_ENABLE):
+          if not event_types & PRE_ENABLE_BIT:
             self.state = State.enabled
           else:
             self.current_alert_types.append(ET.PRE_ENABLE)
 
     # DISABLED
     elif self.state == State.disabled:
-      if self.events.any(ET.ENABLE):
-        if self.events.any(ET.NO_ENTRY):
+      if event_types & ENABLE_BIT:
+        if event_types & NO_ENTRY_BIT:
           self.current_alert_types.append(ET.NO_ENTRY)
 
         else:
-          if self.events.any(ET.PRE_ENABLE):
+          if event_types & PRE_ENABLE_BIT:
             self.state = State.preEnabled
           else:
             self.state = State.enabled
@@ -753,7 +808,7 @@ class Controls:
         lac_log.saturated = abs(steer) >= 0.9
 
     # Check for difference between desired angle and angle for angle based control
-    angle_control_saturated = self.CP.steerControlType == car.CarParams.SteerControlType.angle and \
+    angle_control_saturated = self.angle_steer_control and \
       abs(actuators.steeringAngleDeg - CS.steeringAngleDeg) > STEER_ANGLE_SATURATION_THRESHOLD
 
     if angle_control_saturated and not CS.steeringPressed and self.active:
@@ -765,31 +820,31 @@ class Controls:
     if (lac_log.saturated and not CS.steeringPressed) or \
        (self.saturated_count > STEER_ANGLE_SATURATION_TIMEOUT):
 
-      if len(lat_plan.dPathPoints):
+      d_path_points = lat_plan.dPathPoints
+      if len(d_path_points):
         # Check if we deviated from the path
-        left_deviation = actuators.steer > 0 and lat_plan.dPathPoints[0] < -0.115
-        right_deviation = actuators.steer < 0 and lat_plan.dPathPoints[0] > 0.115
+        d_path_offset = d_path_points[0]
+        left_deviation = actuators.steer > 0 and d_path_offset < -0.115
+        right_deviation = actuators.steer < 0 and d_path_offset > 0.115
 
         if left_deviation or right_deviation:
           self.events.add(EventName.steerSaturated)
 
     # Ensure no NaNs/Infs
-    for p in ACTUATOR_FIELDS:
-      attr = getattr(actuators, p)
-      if not isinstance(attr, Number):
-        continue
-
-      if not math.isfinite(attr):
-        cloudlog.error(f"actuators.{p} not finite {actuators.to_dict()}")
-        setattr(actuators, p, 0.0)
+    if not all(map(math.isfinite, get_numeric_actuators(actuators))):
+      for p in NUMERIC_ACTUATOR_FIELDS:
+        attr = getattr(actuators, p)
+        if not math.isfinite(attr):
+          cloudlog.error("actuators.%s not finite: %s", p, attr)
+          setattr(actuators, p, 0.0)
 
     return actuators, lac_log
 
   def update_button_timers(self, buttonEvents):
     # increment timer for buttons still pressed
-    for k in self.button_timers.keys():
-      if self.button_timers[k] > 0:
-        self.button_timers[k] += 1
+    for k, v in self.button_timers.items():
+      if v > 0:
+        self.button_timers[k] = v + 1
 
     for b in buttonEvents:
       if b.type.raw in self.button_timers:
@@ -798,51 +853,61 @@ class Controls:
   def publish_logs(self, CS, start_time, actuators, lac_log):
     """Send actuators and hud commands to the car, send controlsstate and MPC logging"""
 
-    CC = car.CarControl.new_message()
+    sm = self.sm
+    md = sm['modelV2']
+    lp = sm['lateralPlan']
+
+    # build CarControl directly inside the carControl message, so it does not have to be copied in at send time
+    cc_send = messaging.new_message('carControl', num_first_segment_words=PUBLISH_SEGMENT_WORDS)
+    CC = cc_send.carControl
     CC.enabled = self.enabled
     CC.active = self.active
     CC.actuators = actuators
 
-    if len(self.sm['liveLocationKalman'].orientationNED.value) > 2:
-      CC.roll = self.sm['liveLocationKalman'].orientationNED.value[0]
-      CC.pitch = self.sm['liveLocationKalman'].orientationNED.value[1]
+    orientation_ned = sm['liveLocationKalman'].orientationNED.value
+    if len(orientation_ned) > 2:
+      CC.roll = orientation_ned[0]
+      CC.pitch = orientation_ned[1]
 
     CC.cruiseControl.cancel = CS.cruiseState.enabled and (not self.enabled or not self.CP.pcmCruise)
-    if self.joystick_mode and self.sm.rcv_frame['testJoystick'] > 0 and self.sm['testJoystick'].buttons[0]:
+    if self.joystick_mode and sm.rcv_frame['testJoystick'] > 0 and sm['testJoystick'].buttons[0]:
       CC.cruiseControl.cancel = True
 
     CC.hudControl.setSpeed = float(self.v_cruise_kph * CV.KPH_TO_MS)
     CC.hudControl.speedVisible = self.enabled
     CC.hudControl.lanesVisible = self.enabled
-    CC.hudControl.leadVisible = self.sm['longitudinalPlan'].hasLead
+    CC.hudControl.leadVisible = sm['longitudinalPlan'].hasLead
 
     CC.hudControl.rightLaneVisible = True
     CC.hudControl.leftLaneVisible = True
 
-    recent_blinker = (self.sm.frame - self.last_blinker_frame) * DT_CTRL < 5.0  # 5s blinker cooldown
+    recent_blinker = (sm.frame - self.last_blinker_frame) < BLINKER_COOLDOWN_FRAMES  # 5s blinker cooldown
     ldw_allowed = self.is_ldw_enabled and CS.vEgo > LDW_MIN_SPEED and not recent_blinker \
-                      and not self.active and self.sm['liveCalibration'].calStatus == Calibration.CALIBRATED
-
-    meta = self.sm['modelV2'].meta
-    if len(meta.desirePrediction) and ldw_allowed:
-      right_lane_visible = self.sm['lateralPlan'].rProb > 0.5
-      left_lane_visible = self.sm['lateralPlan'].lProb > 0.5
-      l_lane_change_prob = meta.desirePrediction[Desire.laneChangeLeft - 1]
-      r_lane_change_prob = meta.desirePrediction[Desire.laneChangeRight - 1]
+                      and not self.active and sm['liveCalibration'].calStatus == Calibration.CALIBRATED
+
+    desire_prediction = md.meta.desirePrediction if ldw_allowed else ()
+    if len(desire_prediction):
+      right_lane_visible = lp.rProb > 0.5
+      left_lane_visible = lp.lProb > 0.5
+      l_lane_change_prob = desire_prediction[LANE_CHANGE_LEFT_IDX]
+      r_lane_change_prob = desire_prediction[LANE_CHANGE_RIGHT_IDX]
       cameraOffset = ntune_common_get("cameraOffset")
-      l_lane_close = left_lane_visible and (self.sm['modelV2'].laneLines[1].y[0] > -(1.08 + cameraOffset))
-      r_lane_close = right_lane_visible and (self.sm['modelV2'].laneLines[2].y[0] < (1.08 - cameraOffset))
+      lane_lines = md.laneLines
+      l_lane_close = left_lane_visible and (lane_lines[1].y[0] > -(1.08 + cameraOffset))
+      r_lane_close = right_lane_visible and (lane_lines[2].y[0] < (1.08 - cameraOffset))
 
-      CC.hudControl.leftLaneDepart = bool(l_lane_change_prob > LANE_DEPARTURE_THRESHOLD and l_lane_close)
-      CC.hudControl.rightLaneDepart = bool(r_lane_change_prob > LANE_DEPARTURE_THRESHOLD and r_lane_close)
+      left_lane_depart = bool(l_lane_change_prob > LANE_DEPARTURE_THRESHOLD and l_lane_close)
+      right_lane_depart = bool(r_lane_change_prob > LANE_DEPARTURE_THRESHOLD and r_lane_close)
+      CC.hudControl.leftLaneDepart = left_lane_depart
+      CC.hudControl.rightLaneDepart = right_lane_depart
 
-    if CC.hudControl.rightLaneDepart or CC.hudControl.leftLaneDepart:
-      self.events.add(EventName.ldw)
+      if right_lane_depart or left_lane_depart:
+        self.events.add(EventName.ldw)
 
     clear_event = ET.WARNING if ET.WARNING not in self.current_alert_types else None
-    alerts = self.events.create_alerts(self.current_alert_types, [self.CP, self.sm, self.is_metric, self.soft_disable_timer])
-    self.AM.add_many(self.sm.frame, alerts)
-    self.AM.process_alerts(self.sm.frame, clear_event)
+    alerts = self.events.create_alerts(self.current_alert_types, [self.CP, sm, self.is_metric, self.soft_disable_timer])
+    self.AM.add_many(sm.frame, alerts)
+    self.AM.process_alerts(sm.frame, clear_event)
     CC.hudControl.visualAlert = self.AM.visual_alert
 
     if not self.read_only and self.initialized:
@@ -850,19 +915,20 @@ class Controls:
       can_sends = self.CI.apply(CC)
       self.pm.send('sendcan', can_list_to_can_capnp(can_sends, msgtype='sendcan', valid=CS.canValid))
 
-    force_decel = (self.sm['driverMonitoringState'].awarenessStatus < 0.) or \
+    force_decel = (sm['driverMonitoringState'].awarenessStatus < 0.) or \
                    (self.state == State.softDisabling)
 
     # Curvature & Steering angle
-    params = self.sm['liveParameters']
-    steer_angle_without_offset = math.radians(CS.steeringAngleDeg - params.angleOffsetAverageDeg)
+    params = sm['liveParameters']
+    steer_angle_without_offset_deg = CS.steeringAngleDeg - params.angleOffsetAverageDeg
+    steer_angle_without_offset = math.radians(steer_angle_without_offset_deg)
     curvature = -self.VM.calc_curvature(steer_angle_without_offset, CS.vEgo)
 
     # NDA Add.. (PSK)
-    road_limit_speed, left_dist, max_speed_log = self.cal_max_speed(self.sm.frame, CS.vEgo, self.sm, CS)
+    road_limit_speed, left_dist, max_speed_log = self.cal_max_speed(sm.frame, CS.vEgo, sm, CS)
 
     # controlsState
-    dat = messaging.new_message('controlsState')
+    dat = messaging.new_message('controlsState', num_first_segment_words=PUBLISH_SEGMENT_WORDS)
     dat.valid = CS.canValid
     controlsState = dat.controlsState
     controlsState.alertText1 = self.AM.alert_text_1
@@ -872,9 +938,9 @@ class Controls:
     controlsState.alertBlinkingRate = self.AM.alert_rate
     controlsState.alertType = self.AM.alert_type
     controlsState.alertSound = self.AM.audible_alert
-    controlsState.canMonoTimes = list(CS.canMonoTimes)
-    controlsState.longitudinalPlanMonoTime = self.sm.logMonoTime['longitudinalPlan']
-    controlsState.lateralPlanMonoTime = self.sm.logMonoTime['lateralPlan']
+    controlsState.canMonoTimes = CS.canMonoTimes
+    controlsState.longitudinalPlanMonoTime = sm.logMonoTime['longitudinalPlan']
+    controlsState.lateralPlanMonoTime = sm.logMonoTime['lateralPlan']
     controlsState.enabled = self.enabled
     controlsState.active = self.active
     controlsState.curvature = curvature
@@ -903,12 +969,12 @@ class Controls:
     controlsState.canErrorCounter = self.can_error_counter
 
     # NDA
-    controlsState.roadLimitSpeedActive = road_speed_limiter_get_active()
+    controlsState.roadLimitSpeedActive = self.road_limiter_active
     controlsState.roadLimitSpeed = road_limit_speed
     controlsState.roadLimitSpeedLeftDist = left_dist
 
     # STEER
-    controlsState.angleSteers = steer_angle_without_offset * CV.RAD_TO_DEG
+    controlsState.angleSteers = steer_angle_without_offset_deg
     controlsState.steerRatio = self.VM.sR
     controlsState.steerRateCost = ntune_common_get('steerRateCost')
     controlsState.steerActuatorDelay = ntune_common_get('steerActuatorDelay')
@@ -921,46 +987,38 @@ class Controls:
     controlsState.longitudinalActuatorDelayLowerBound = ntune_scc_get('longitudinalActuatorDelayLowerBound')
     controlsState.longitudinalActuatorDelayUpperBound = ntune_scc_get('longitudinalActuatorDelayUpperBound')
 
-    if self.joystick_mode:
-      controlsState.lateralControlState.debugState = lac_log
-    elif self.CP.steerControlType == car.CarParams.SteerControlType.angle:
-      controlsState.lateralControlState.angleState = lac_log
-    elif self.CP.lateralTuning.which() == 'pid':
-      controlsState.lateralControlState.pidState = lac_log
-    elif self.CP.lateralTuning.which() == 'lqr':
-      controlsState.lateralControlState.lqrState = lac_log
-    elif self.CP.lateralTuning.which() == 'indi':
-      controlsState.lateralControlState.indiState = lac_log
+    if self.lat_state_field is not None:
+      setattr(controlsState.lateralControlState, self.lat_state_field, lac_log)
     self.pm.send('controlsState', dat)
 
     # carState
     car_events = self.events.to_msg()
-    cs_send = messaging.new_message('carState')
+    cs_send = messaging.new_message('carState', num_first_segment_words=PUBLISH_SEGMENT_WORDS)
     cs_send.valid = CS.canValid
+    # capnp copies the reader into the message in C++, only the events list is replaced on top of it
     cs_send.carState = CS
     cs_send.carState.events = car_events
     self.pm.send('carState', cs_send)
 
     # carEvents - logged every second or on change
-    if (self.sm.frame % int(1. / DT_CTRL) == 0) or (self.events.names != self.events_prev):
-      ce_send = messaging.new_message('carEvents', len(self.events))
+    if (sm.frame % CAR_EVENTS_PERIOD == 0) or (self.events.names != self.events_prev):
+      ce_send = messaging.new_message('carEvents', len(self.events), num_first_segment_words=PUBLISH_SEGMENT_WORDS)
       ce_send.carEvents = car_events
       self.pm.send('carEvents', ce_send)
-    self.events_prev = self.events.names.copy()
+    self.events_prev[:] = self.events.names
 
     # carParams - logged every 50 seconds (> 1 per segment)
-    if (self.sm.frame % int(50. / DT_CTRL) == 0):
+    if (sm.frame % CAR_PARAMS_PERIOD == 0):
       cp_send = messaging.new_message('carParams')
       cp_send.carParams = self.CP
       self.pm.send('carParams', cp_send)
 
     # carControl
-    cc_send = messaging.new_message('carControl')
+    cc_send.logMonoTime = int(sec_since_boot() * 1e9)
     cc_send.valid = CS.canValid
-    cc_send.carControl = CC
     self.pm.send('carControl', cc_send)
 
-    # copy CarControl to pass to CarInterface on the next iteration
+    # keep CarControl to pass to CarInterface on the next iteration
     self.CC = CC
 
 
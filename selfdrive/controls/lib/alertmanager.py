@@ -54,21 +54,21 @@ class AlertManager:
 
   def add_many(self, frame: int, alerts: List[Alert]) -> None:
     for alert in alerts:
-      key = alert.alert_type
-      self.alerts[key].alert = alert
-      if not self.alerts[key].active(frame):
-        self.alerts[key].start_frame = frame
-      min_end_frame = self.alerts[key].start_frame + alert.duration
-      self.alerts[key].end_frame = max(frame + 1, min_end_frame)
+      entry = self.alerts[alert.alert_type]
+      entry.alert = alert
+      if not entry.active(frame):
+        entry.start_frame = frame
+      min_end_frame = entry.start_frame + alert.duration
+      entry.end_frame = max(frame + 1, min_end_frame)
 
   def process_alerts(self, frame: int, clear_event_type=None) -> None:
     current_alert = AlertEntry()
-    for k, v in self.alerts.items():
+    for v in self.alerts.values():
       if v.alert is None:
         continue
 
       if clear_event_type is not None and v.alert.event_type == clear_event_type:
-        self.alerts[k].end_frame = -1
+        v.end_frame = -1
 
       # sort by priority first and then by start_frame
       greater = current_alert.alert is None or (v.alert.priority, v.start_frame) > (current_alert.alert.priority, current_alert.start_frame)
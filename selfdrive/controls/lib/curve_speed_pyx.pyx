@@ -0,0 +1,63 @@
+# distutils: language = c++
+# cython: language_level = 3
+cimport cython
+from libc.math cimport sqrt, fabs, pow
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef inline double gradient_at(const double[::1] f, const double[::1] x, int i) nogil:
+  # same stencils as np.gradient(f, x) with edge_order=1, evaluated at a single index
+  cdef int n = f.shape[0]
+  cdef double hs, hd
+  if i == 0:
+    return (f[1] - f[0]) / (x[1] - x[0])
+  if i == n - 1:
+    return (f[n - 1] - f[n - 2]) / (x[n - 1] - x[n - 2])
+  hs = x[i] - x[i - 1]
+  hd = x[i + 1] - x[i]
+  return (hs * hs * f[i + 1] + (hd * hd - hs * hs) * f[i] - hd * hd * f[i - 1]) / (hs * hd * (hd + hs))
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cpdef double curve_model_speed(const double[::1] x, const double[::1] y, double v_ego, int start, int end, double factor):
+  """Mean speed allowed by the path curvature over [start, end), scaled by factor.
+
+  Fused version of np.gradient twice, curvature, clip, sqrt and mean in one pass with no temporary arrays.
+  x and y must be contiguous float64 arrays, not capnp lists.
+  """
+  cdef int n = x.shape[0]
+  cdef double a_y_max = 2.975 - v_ego * 0.0375  # ~1.85 @ 75mph, ~2.6 @ 25mph
+  cdef double dy_prev = 0., dy, dy_next, d2y, hs, hd, curv
+  cdef double total = 0.
+  cdef int i
+
+  if start > 0:
+    dy_prev = gradient_at(y, x, start - 1)
+  dy = gradient_at(y, x, start)
+
+  for i in range(start, end):
+    dy_next = gradient_at(y, x, i + 1) if i + 1 < n else 0.
+
+    if i == 0:
+      d2y = (dy_next - dy) / (x[1] - x[0])
+    elif i == n - 1:
+      d2y = (dy - dy_prev) / (x[n - 1] - x[n - 2])
+    else:
+      hs = x[i] - x[i - 1]
+      hd = x[i + 1] - x[i]
+      d2y = (hs * hs * dy_next + (hd * hd - hs * hs) * dy - hd * hd * dy_prev) / (hs * hd * (hd + hs))
+
+    # clip like np.clip, a nan curvature stays nan
+    curv = fabs(d2y / pow(1. + dy * dy, 1.5))
+    if curv < 1e-4:
+      curv = 1e-4
+    total += sqrt(a_y_max / curv)
+
+    dy_prev = dy
+    dy = dy_next
+
+  return total / (end - start) * factor
@@ -36,6 +36,19 @@ class ET:
   PERMANENT = 'permanent'
 
 
+# one bit per event type, see Events.type_mask
+ET_BITS = {et: 1 << i for i, et in enumerate([ET.ENABLE, ET.PRE_ENABLE, ET.NO_ENTRY, ET.WARNING, ET.USER_DISABLE,
+                                              ET.SOFT_DISABLE, ET.IMMEDIATE_DISABLE, ET.PERMANENT])}
+ENABLE_BIT = ET_BITS[ET.ENABLE]
+PRE_ENABLE_BIT = ET_BITS[ET.PRE_ENABLE]
+NO_ENTRY_BIT = ET_BITS[ET.NO_ENTRY]
+WARNING_BIT = ET_BITS[ET.WARNING]
+USER_DISABLE_BIT = ET_BITS[ET.USER_DISABLE]
+SOFT_DISABLE_BIT = ET_BITS[ET.SOFT_DISABLE]
+IMMEDIATE_DISABLE_BIT = ET_BITS[ET.IMMEDIATE_DISABLE]
+PERMANENT_BIT = ET_BITS[ET.PERMANENT]
+
+
 # get event name from enum
 EVENT_NAME = {v: k for k, v in EventName.schema.enumerants.items()}
 
@@ -45,6 +58,7 @@ class Events:
     self.events = []
     self.static_events = []
     self.events_prev = dict.fromkeys(EVENTS.keys(), 0)
+    self.counted_events = set()
 
   @property
   def names(self):
@@ -59,8 +73,14 @@ class Events:
     self.events.append(event_name)
 
   def clear(self):
-    self.events_prev = {k: (v + 1 if k in self.events else 0) for k, v in self.events_prev.items()}
-    self.events = self.static_events.copy()
+    # count consecutive frames per event in place, only events active now or last time can change
+    active = {e for e in self.events if e in self.events_prev}
+    for e in self.counted_events - active:
+      self.events_prev[e] = 0
+    for e in active:
+      self.events_prev[e] += 1
+    self.counted_events = active
+    self.events[:] = self.static_events
 
   def any(self, event_type):
     for e in self.events:
@@ -68,6 +88,13 @@ class Events:
         return True
     return False
 
+  def type_mask(self):
+    # ET_BITS of every event type present, to test several types with a single pass
+    mask = 0
+    for e in self.events:
+      mask |= EVENT_TYPE_MASKS.get(e, 0)
+    return mask
+
   def create_alerts(self, event_types, callback_args=None):
     if callback_args is None:
       callback_args = []
@@ -1007,3 +1034,5 @@ EVENTS: Dict[int, Dict[str, Union[Alert, Callable[[Any, messaging.SubMaster, boo
   },
 
 }
+
+EVENT_TYPE_MASKS = {e: sum(ET_BITS[et] for et in types) for e, types in EVENTS.items()}
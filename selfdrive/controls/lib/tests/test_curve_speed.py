@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+import unittest
+import numpy as np
+
+from selfdrive.controls.lib.curve_speed_pyx import curve_model_speed  # pylint: disable=no-name-in-module, import-error
+from selfdrive.controls.lib.lane_planner import TRAJECTORY_SIZE
+
+
+def curve_model_speed_np(x, y, v_ego, start, end, factor):
+  dy = np.gradient(y, x)
+  d2y = np.gradient(dy, x)
+  curv = d2y / (1 + dy ** 2) ** 1.5
+  curv = curv[start:end]
+  a_y_max = 2.975 - v_ego * 0.0375
+  v_curvature = np.sqrt(a_y_max / np.clip(np.abs(curv), 1e-4, None))
+  return np.mean(v_curvature) * factor
+
+
+class TestCurveSpeed(unittest.TestCase):
+  def setUp(self):
+    np.random.seed(0)
+
+  def random_path(self):
+    # unevenly spaced x like the model output
+    x = np.cumsum(np.random.uniform(0.5, 5.0, TRAJECTORY_SIZE))
+    y = np.random.uniform(-0.5, 0.5) * x ** 2 / 100 + np.random.normal(0, 0.2, TRAJECTORY_SIZE)
+    return x, y
+
+  def assert_matches(self, x, y, v_ego, start, end, factor=0.7):
+    expected = curve_model_speed_np(x, y, v_ego, start, end, factor)
+    np.testing.assert_allclose(curve_model_speed(x, y, v_ego, start, end, factor), expected, rtol=1e-9)
+
+  def test_window(self):
+    for _ in range(100):
+      x, y = self.random_path()
+      self.assert_matches(x, y, np.random.uniform(0, 40), 5, TRAJECTORY_SIZE - 10)
+
+  def test_edges(self):
+    for _ in range(100):
+      x, y = self.random_path()
+      v_ego = np.random.uniform(0, 40)
+      self.assert_matches(x, y, v_ego, 0, 1)
+      self.assert_matches(x, y, v_ego, TRAJECTORY_SIZE - 1, TRAJECTORY_SIZE)
+      self.assert_matches(x, y, v_ego, 0, TRAJECTORY_SIZE)
+
+  def test_straight_path(self):
+    # zero curvature is clipped to 1e-4
+    x = np.linspace(0., 100., TRAJECTORY_SIZE)
+    y = np.zeros(TRAJECTORY_SIZE)
+    self.assert_matches(x, y, 20., 5, TRAJECTORY_SIZE - 10)
+
+  def test_nan(self):
+    x, y = self.random_path()
+    y[10] = np.nan
+    self.assertTrue(np.isnan(curve_model_speed_np(x, y, 20., 5, TRAJECTORY_SIZE - 10, 0.7)))
+    self.assertTrue(np.isnan(curve_model_speed(x, y, 20., 5, TRAJECTORY_SIZE - 10, 0.7)))
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+import unittest
+
+from selfdrive.controls.lib.events import Events, ET_BITS, EVENTS
+
+
+class TestEvents(unittest.TestCase):
+  def assert_type_mask_matches_any(self, events):
+    mask = events.type_mask()
+    for et, bit in ET_BITS.items():
+      self.assertEqual(bool(mask & bit), events.any(et), f"{events.names} {et}")
+
+  def test_type_mask(self):
+    events = Events()
+    self.assertEqual(events.type_mask(), 0)
+    self.assert_type_mask_matches_any(events)
+
+    for name in EVENTS:
+      events = Events()
+      events.add(name)
+      self.assert_type_mask_matches_any(events)
+
+  def test_type_mask_all_events(self):
+    events = Events()
+    for name in EVENTS:
+      events.add(name)
+    self.assert_type_mask_matches_any(events)
+
+
+if __name__ == "__main__":
+  unittest.main()